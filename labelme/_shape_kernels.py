@@ -0,0 +1,73 @@
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _pt_seg_d2(px, py, ax, ay, bx, by):
+    """Squared distance from point p to the segment a-b"""
+    dx = bx - ax
+    dy = by - ay
+    e2 = dx * dx + dy * dy
+    t = 0.0
+    if e2 > 0.0:
+        t = ((px - ax) * dx + (py - ay) * dy) / e2
+        if t < 0.0:
+            t = 0.0
+        elif t > 1.0:
+            t = 1.0
+    qx = ax + t * dx - px
+    qy = ay + t * dy - py
+    return qx * qx + qy * qy
+
+
+def _scan(px, py, arr):
+    """Find the nearest vertex and the nearest edge of a closed polygon
+
+    Runs a single pass over the C-contiguous (N, 2) float64 array `arr`
+    (as provided by Shape.poly_array) using scalar temporaries only.
+    Edge k joins vertex k and vertex (k + 1) % N.
+    Returns (vertex_index, edge_index, vertex_dist2, edge_dist2).
+    """
+    n = arr.shape[0]
+    vtx_idx = -1
+    edge_idx = -1
+    vtx_d2 = 0.0
+    edge_d2 = 0.0
+    for i in range(n):
+        ax = arr[i, 0]
+        ay = arr[i, 1]
+        dx = px - ax
+        dy = py - ay
+        d2 = dx * dx + dy * dy
+        if vtx_idx < 0 or d2 < vtx_d2:
+            vtx_idx = i
+            vtx_d2 = d2
+
+        j = i + 1 if i + 1 < n else 0
+        d2 = _pt_seg_d2(px, py, ax, ay, arr[j, 0], arr[j, 1])
+        if edge_idx < 0 or d2 < edge_d2:
+            edge_idx = i
+            edge_d2 = d2
+    return vtx_idx, edge_idx, vtx_d2, edge_d2
+
+
+scan = None
+if numba is not None:
+    # explicit signatures: compiled at import, never recompiled at runtime
+    try:
+        _pt_seg_d2 = numba.njit(
+            "f8(f8, f8, f8, f8, f8, f8)",
+            cache=True,
+            fastmath=True,
+            inline="always",
+        )(_pt_seg_d2)
+        scan = numba.njit(
+            "Tuple((i8, i8, f8, f8))(f8, f8, f8[:, ::1])",
+            cache=True,
+            fastmath=True,
+        )(_scan)
+    except Exception:
+        # e.g. RuntimeError "no locator available" in frozen builds;
+        # Shape then falls back to the NumPy scan
+        scan = None
@@ -1557,7 +1557,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self.labelList.clearSelection()
         self._noSelectionSlot = False
         self.canvas.loadShapes(shapes, replace=replace)
-        self.canvas.init_poly_array()
         self.canvas.init_zeroImg()
         self.canvas.getDistMapUpdate()
         self.drawRenderedShapes(mode=mode)
@@ -2,14 +2,12 @@ import copy
 from labelme.logger import logger
 import math
 
+from qtpy import PYQT5
 from qtpy import QtCore
 from qtpy import QtGui
 import numpy as np
-import labelme.utils
-import time
 
-# TODO(unknown):
-# - [opt] Store paths instead of creating new ones at each paint.
+from labelme import _shape_kernels
 
 
 DEFAULT_LINE_COLOR = QtGui.QColor(0, 255, 0, 128)  # bf hovering
@@ -20,6 +18,52 @@ DEFAULT_VERTEX_FILL_COLOR = QtGui.QColor(0, 255, 0, 255)  # hovering
 DEFAULT_HVERTEX_FILL_COLOR = QtGui.QColor(255, 255, 255, 255)  # hovering
 
 
+def _array_to_qpolygonf(array):
+    """Build a QPolygonF from an (N, 2) float64 array in one go"""
+    n = len(array)
+    if PYQT5 and n:
+        # write straight into the QPointF storage of the polygon
+        polygon = QtGui.QPolygonF(n)
+        ptr = polygon.data()
+        ptr.setsize(array.size * array.itemsize)
+        np.frombuffer(ptr, dtype=np.float64).reshape(n, 2)[:] = array
+        return polygon
+    return QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in array])
+
+
+class _PointsView(object):
+    """Sequence of QPointF backed by the vertex buffer of a Shape"""
+
+    def __init__(self, shape):
+        self._shape = shape
+
+    def __len__(self):
+        return self._shape._n
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            array = self._shape.poly_array[key]
+            return [QtCore.QPointF(x, y) for x, y in array]
+        return QtCore.QPointF(*self._shape.poly_array[key])
+
+    def __setitem__(self, key, value):
+        self._shape[key] = value
+
+    def __iter__(self):
+        for x, y in self._shape.poly_array:
+            yield QtCore.QPointF(x, y)
+
+    def __eq__(self, other):
+        if isinstance(other, _PointsView):
+            other = other._shape.poly_array
+        else:
+            other = [(p.x(), p.y()) for p in other]
+        return np.array_equal(self._shape.poly_array, other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class Shape(object):
 
     # Render handles as squares
@@ -45,6 +89,9 @@ class Shape(object):
     point_size = 8
     scale = 1.0
 
+    # QPen per (rgba, width), shared by all shapes across repaints
+    _pen_cache = {}
+
     def __init__(
         self,
         label=None,
@@ -56,6 +103,18 @@ class Shape(object):
     ):
         self.label = label
         self.group_id = group_id
+        self._poly_buf = np.empty((0, 2), dtype=np.float64, order="C")
+        self._n = 0
+        self._edge_cache = None
+        self._scan_cache = None
+        self._version = 0
+        self._paths_dirty = True
+        self._paths_key = None
+        self._line_path_cache = None
+        self._vrtx_path_cache = None
+        self._cached_path = None
+        self._bbox_cache = None
+        self.x_span = self.y_span = 0
         self.points = []
         self.fill = False
         self.selected = False
@@ -64,8 +123,6 @@ class Shape(object):
         self.poly = None
         self.other_data = {}
         self.vertex_epsilon = vertex_epsilon
-        self.prev_val = None
-        self.poly_array = None
 
         self._highlightIndex = None
         self._highlightMode = self.NEAR_VERTEX
@@ -103,48 +160,109 @@ class Shape(object):
         ]:
             raise ValueError("Unexpected shape_type: {}".format(value))
         self._shape_type = value
+        self._paths_dirty = True
+
+    @property
+    def points(self):
+        return _PointsView(self)
+
+    @points.setter
+    def points(self, value):
+        if isinstance(value, _PointsView):
+            self.poly_array = value._shape.poly_array.copy()
+            return
+        value = list(value)
+        self._n = 0
+        self._ensure_capacity(len(value))
+        buf = self._poly_buf
+        for i, p in enumerate(value):
+            buf[i, 0] = p.x()
+            buf[i, 1] = p.y()
+        self._n = len(value)
+        self._invalidate_geometry()
+
+    @property
+    def poly_array(self):
+        return self._poly_buf[:self._n]
+
+    @poly_array.setter
+    def poly_array(self, value):
+        value = np.asarray(value).reshape(-1, 2)
+        self._n = 0
+        self._ensure_capacity(len(value))
+        self._poly_buf[:len(value)] = value
+        self._n = len(value)
+        self._invalidate_geometry()
+
+    def _ensure_capacity(self, need):
+        """Grow the vertex buffer geometrically to amortize appends"""
+        capacity = self._poly_buf.shape[0]
+        if need <= capacity:
+            return
+        buf = np.empty(
+            (max(need, 2 * capacity, 8), 2), dtype=np.float64, order="C"
+        )
+        buf[:self._n] = self._poly_buf[:self._n]
+        self._poly_buf = buf
+
+    def _invalidate_geometry(self):
+        """Drop data derived from poly_array after the vertices changed"""
+        self._edge_cache = None
+        self._version += 1
+        self._paths_dirty = True
 
     def close(self):
         self._closed = True
+        self._paths_dirty = True
 
     def addPoint(self, point):
-        if self.points and point == self.points[0]:
+        if self._n and point == self[0]:
             self.close()
         else:
-            self.points.append(point)
-            if self.poly_array is None:
-                self.init_poly_array()
-                # import IPython; IPython.embed()
-                return
-            
-            self.poly_array = np.append(self.poly_array, [[point.x(), point.y()]], axis=0)
+            self._ensure_capacity(self._n + 1)
+            self._poly_buf[self._n, 0] = point.x()
+            self._poly_buf[self._n, 1] = point.y()
+            self._n += 1
+            self._invalidate_geometry()
 
     def canAddPoint(self):
         return self.shape_type in ["polygon", "trace", "linestrip"]
 
     def popPoint(self):
-        if self.points:
-            self.poly_array = self.poly_array[:-1]
-            return self.points.pop()
+        if self._n:
+            point = self[-1]
+            self._n -= 1
+            self._invalidate_geometry()
+            return point
         return None
 
     def insertPoint(self, i, point):
-        self.points.insert(i, point)
-        np.insert(self.poly_array, i, np.array([point.x(), point.y()]))
+        if i < 0:
+            i = max(i + self._n, 0)
+        i = min(i, self._n)
+        self._ensure_capacity(self._n + 1)
+        self._poly_buf[i + 1:self._n + 1] = self._poly_buf[i:self._n]
+        self._poly_buf[i, 0] = point.x()
+        self._poly_buf[i, 1] = point.y()
+        self._n += 1
+        self._invalidate_geometry()
 
     def removePoint(self, i):
-        try:
-            self.points.pop(i)
-            self.poly_array = np.delete(self.poly_array, i, axis=0)
-        except IndexError:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
             logger.warn(f"Index Error with point {i}")
-            pass
+            return
+        self._poly_buf[i:self._n - 1] = self._poly_buf[i + 1:self._n]
+        self._n -= 1
+        self._invalidate_geometry()
 
     def isClosed(self):
         return self._closed
 
     def setOpen(self):
         self._closed = False
+        self._paths_dirty = True
 
     def getRectFromLine(self, pt1, pt2):
         x1, y1 = pt1.x(), pt1.y()
@@ -156,56 +274,31 @@ class Shape(object):
             color = (
                 self.select_line_color if self.selected else self.line_color
             )
-            pen = QtGui.QPen(color)
             # Try using integer sizes for smoother drawing(?)
-            pen.setWidth(max(1, int(round(2.0 / self.scale))))
+            width = max(1, int(round(2.0 / self.scale)))
+            key = (color.rgba(), width)
+            pen = Shape._pen_cache.get(key)
+            if pen is None:
+                pen = QtGui.QPen(color)
+                pen.setWidth(width)
+                Shape._pen_cache[key] = pen
             painter.setPen(pen)
 
-            line_path = QtGui.QPainterPath()
-            vrtx_path = QtGui.QPainterPath()
-
-            if self.shape_type == "rectangle":
-                assert len(self.points) in [1, 2]
-                if len(self.points) == 2:
-                    rectangle = self.getRectFromLine(*self.points)
-                    line_path.addRect(rectangle)
-                for i in range(len(self.points)):
-                    self.drawVertex(vrtx_path, i)
-            elif self.shape_type == "circle":
-                assert len(self.points) in [1, 2]
-                if len(self.points) == 2:
-                    rectangle = self.getCircleRectFromLine(self.points)
-                    line_path.addEllipse(rectangle)
-                for i in range(len(self.points)):
-                    self.drawVertex(vrtx_path, i)
-            elif self.shape_type == "linestrip":
-                line_path.moveTo(self.points[0])
-                for i, p in enumerate(self.points):
-                    line_path.lineTo(p)
-                    self.drawVertex(vrtx_path, i)
+            # handle geometry also depends on these class-level settings
+            key = (self.scale, self.point_size, self.point_type)
+            if self._paths_dirty or self._paths_key != key:
+                self._buildPaths()
+            line_path = self._line_path_cache
+            vrtx_path = self._vrtx_path_cache
+
+            if self._highlightIndex is not None:
+                vertex_fill_color = self.hvertex_fill_color
             else:
-                line_path.moveTo(self.points[0])
-                # self.poly = QtGui.QPolygonF(self.points)
-                self.init_poly_array()
-                self.x_span = np.max(self.poly_array[:, 0]) -\
-                    np.min(self.poly_array[:, 0])
-                self.y_span = np.max(self.poly_array[:, 1]) -\
-                    np.min(self.poly_array[:, 1])
-                # self.onPolygonChange()
-                # Uncommenting the following line will draw 2 paths
-                # for the 1st vertex, and make it non-filled, which
-                # may be desirable.
-                # self.drawVertex(vrtx_path, 0)
-
-                for i, p in enumerate(self.points):
-                    line_path.lineTo(p)
-                    self.drawVertex(vrtx_path, i)
-                if self.isClosed():
-                    line_path.lineTo(self.points[0])
+                vertex_fill_color = self.vertex_fill_color
 
             painter.drawPath(line_path)
             painter.drawPath(vrtx_path)
-            painter.fillPath(vrtx_path, self._vertex_fill_color)
+            painter.fillPath(vrtx_path, vertex_fill_color)
             if self.fill:
                 color = (
                     self.select_fill_color
@@ -214,6 +307,61 @@ class Shape(object):
                 )
                 painter.fillPath(line_path, color)
 
+    def _buildPaths(self):
+        line_path = QtGui.QPainterPath()
+        vrtx_path = QtGui.QPainterPath()
+        if hasattr(vrtx_path, "reserve"):  # Qt >= 5.13
+            # a round handle takes 13 path elements, a square one 5
+            vrtx_path.reserve(13 * self._n)
+
+        if self.shape_type == "rectangle":
+            assert len(self.points) in [1, 2]
+            if len(self.points) == 2:
+                rectangle = self.getRectFromLine(*self.points)
+                line_path.addRect(rectangle)
+        elif self.shape_type == "circle":
+            assert len(self.points) in [1, 2]
+            if len(self.points) == 2:
+                rectangle = self.getCircleRectFromLine(self.points)
+                line_path.addEllipse(rectangle)
+        elif self.shape_type == "linestrip":
+            line_path.addPolygon(_array_to_qpolygonf(self.poly_array))
+        else:
+            line_path.addPolygon(_array_to_qpolygonf(self.poly_array))
+            self.x_span, self.y_span = np.ptp(self.poly_array, axis=0)
+            # Uncommenting the following line will draw 2 paths
+            # for the 1st vertex, and make it non-filled, which
+            # may be desirable.
+            # self.drawVertex(vrtx_path, 0)
+
+            if self.isClosed():
+                line_path.closeSubpath()
+        self.drawVertices(vrtx_path)
+
+        self._line_path_cache = line_path
+        self._vrtx_path_cache = vrtx_path
+        self._paths_key = (self.scale, self.point_size, self.point_type)
+        self._paths_dirty = False
+
+    def drawVertices(self, path):
+        """Add the handles of all vertices to path"""
+        d = self.point_size / (self.scale * 2)
+        highlight = self._highlightIndex
+        if self.point_type == self.P_ROUND:
+            addEllipse = path.addEllipse
+            QPointF = QtCore.QPointF
+            for i, (x, y) in enumerate(self.poly_array.tolist()):
+                if i != highlight:
+                    addEllipse(QPointF(x, y), d, d)
+        else:
+            addRect = path.addRect
+            half = d / 2
+            for i, (x, y) in enumerate(self.poly_array.tolist()):
+                if i != highlight:
+                    addRect(x - half, y - half, d, d)
+        if highlight is not None and 0 <= highlight < self._n:
+            self.drawVertex(path, highlight)
+
     def drawVertex(self, path, i):
         d = self.point_size / (self.scale * 2)
         shape = self.point_type
@@ -226,10 +374,6 @@ class Shape(object):
                 logger.info("highlighting the vertecies,\
                     wasnt able to keep up with cursor")
                 pass
-        if self._highlightIndex is not None:
-            self._vertex_fill_color = self.hvertex_fill_color
-        else:
-            self._vertex_fill_color = self.vertex_fill_color
         if shape == self.P_SQUARE:
             path.addRect(point.x() - d / 2, point.y() - d / 2, d, d)
         elif shape == self.P_ROUND:
@@ -237,57 +381,85 @@ class Shape(object):
         else:
             assert False, "unsupported vertex shape"
 
+    def _scan(self, point):
+        """Nearest vertex and edge of point, memoized per geometry version
+
+        Returns (vertex_index, edge_index, vertex_dist2, edge_dist2) where
+        edge k joins vertex k and vertex k + 1 (wrapping around).
+        """
+        px, py = point.x(), point.y()
+        key = (px, py, self._version)
+        if self._scan_cache is None or self._scan_cache[0] != key:
+            if _shape_kernels.scan is not None:
+                result = _shape_kernels.scan(px, py, self.poly_array)
+            else:
+                result = self._scan_numpy(px, py)
+            self._scan_cache = key, result
+        return self._scan_cache[1]
+
+    def _segmentTables(self):
+        """Edge vectors and squared lengths, built once per geometry change"""
+        if self._edge_cache is None:
+            A = self.poly_array
+            E = np.roll(A, -1, axis=0) - A
+            Elen2 = np.einsum("ij,ij->i", E, E)
+            # degenerate segments: AP.E is 0 there, so t clips to 0
+            Elen2[Elen2 == 0] = 1
+            self._edge_cache = A[:, 0], A[:, 1], E[:, 0], E[:, 1], Elen2
+        return self._edge_cache
+
+    def _scan_numpy(self, px, py):
+        Ax, Ay, Ex, Ey, Elen2 = self._segmentTables()
+        dx = px - Ax
+        dy = py - Ay
+        vtx_d2 = dx * dx + dy * dy
+        pe = dx * Ex + dy * Ey
+        t = np.clip(pe / Elen2, 0, 1)
+        # |AP - t * E|^2 expanded, reusing |AP|^2 from the vertex test
+        edge_d2 = vtx_d2 - t * (2 * pe - t * Elen2)
+        vtx, edge = int(np.argmin(vtx_d2)), int(np.argmin(edge_d2))
+        return vtx, edge, vtx_d2[vtx], edge_d2[edge]
+
+    def _farFromBBox(self, point, epsilon):
+        """True if no vertex or edge can lie within epsilon of point"""
+        if self._bbox_cache is None or self._bbox_cache[0] != self._version:
+            xmin, ymin = self.poly_array.min(axis=0)
+            xmax, ymax = self.poly_array.max(axis=0)
+            self._bbox_cache = self._version, xmin, ymin, xmax, ymax
+        _, xmin, ymin, xmax, ymax = self._bbox_cache
+        px, py = point.x(), point.y()
+        return (
+            px < xmin - epsilon
+            or px > xmax + epsilon
+            or py < ymin - epsilon
+            or py > ymax + epsilon
+        )
+
     def nearestVertex(self, point, epsilon):
-        self.component_dist = self.poly_array - np.array([point.x(),
-                                                          point.y()])
-        dist = np.sum((self.component_dist)**2, axis=1)
-        if np.sqrt(np.min(dist)) < epsilon:
-            return np.argmin(dist), None
+        if self._n == 0 or self._farFromBBox(point, epsilon):
+            return None, None
+        index, _, dist2, _ = self._scan(point)
+        if dist2 < epsilon * epsilon:
+            return index, None
         else:
-            return None, np.argmin(dist)
+            return None, index
 
     def nearestEdge(self, point, epsilon, minDistIndex=None):
+        """Return the insertion index of the edge closest to point
 
-        # TODO further optimize the algorightm, maybe preselect
-        # those which are closer than y_span/2 or x_span/2
-        self.t = time.time()
-        if (np.abs(self.t - np.round(self.t)) <= 0.005) and\
-                self.prev_val is not None:
-            return self.prev_val
-
-        lenght = len(self.poly_array)
-        for i, j in zip(range(
-                minDistIndex,
-                minDistIndex + int(lenght / 2)),
-                range(minDistIndex, minDistIndex - int(lenght / 2), -1)):
-
-            if i == 0:
-                line_pos = np.array([self.poly_array[-1], self.poly_array[0]])
-            elif i == lenght:
-                line_pos = np.array([self.poly_array[-1], self.poly_array[0]])
-            else:
-                i = i % lenght
-                line_pos = self.poly_array[i - 1:i + 1]
-            if j > 0 or j < -1:
-                line_neg = self.poly_array[j - 1:j + 1]
-            elif j == 0:
-                line_neg = np.array([self.poly_array[-1], self.poly_array[0]])
-            elif j == -1:
-                line_neg = self.poly_array[:2]
-
-            dist_i, dist_j = [labelme.utils.distancetoline(point, line)
-                              for line in [line_pos, line_neg]]
-            if dist_i <= epsilon:
-                self.prev_val = i
-                return i
-            elif dist_j <= epsilon:
-                self.prev_val = i
-                return j
-
+        All segments (including the closing one) are tested at once;
+        minDistIndex is accepted for compatibility but no longer needed.
+        """
+        if self._n < 2 or self._farFromBBox(point, epsilon):
+            return None
+        _, index, _, dist2 = self._scan(point)
+        if dist2 < epsilon * epsilon:
+            # edge index connects vertices index and index + 1
+            return index + 1
         return None
 
     def containsPoint(self, point):
-        return self.makePath().contains(point)
+        return self._cachedPath().contains(point)
 
     def getCircleRectFromLine(self, line):
         """Computes parameters to draw with `QPainterPath::addEllipse`"""
@@ -311,22 +483,33 @@ class Shape(object):
                 rectangle = self.getCircleRectFromLine(self.points)
                 path.addEllipse(rectangle)
         else:
-            path = QtGui.QPainterPath(self.points[0])
-            for p in self.points[1:]:
-                path.lineTo(p)
+            path = QtGui.QPainterPath()
+            path.addPolygon(_array_to_qpolygonf(self.poly_array))
         return path
 
+    def _cachedPath(self):
+        """makePath() result, rebuilt only after the geometry changed"""
+        key = (self._version, self.shape_type)
+        if self._cached_path is None or self._cached_path[0] != key:
+            self._cached_path = key, self.makePath()
+        return self._cached_path[1]
+
     def boundingRect(self):
-        return self.makePath().boundingRect()
+        return self._cachedPath().boundingRect()
 
     def moveBy(self, offset):
-        self.points = [p + offset for p in self.points]
-        self.poly_array = self.poly_array + np.array([offset.x(), offset.y()])
+        # one contiguous in-place pass instead of two strided columns
+        self._poly_buf[:self._n] += np.asarray(
+            (offset.x(), offset.y()), dtype=self._poly_buf.dtype
+        )
+        self._invalidate_geometry()
 
     def moveVertexBy(self, i, offset):
-        self.points[i] = self.points[i] + offset
-        self.poly_array[i] = self.poly_array[i] + np.array([offset.x(),
-                                                            offset.y()])
+        if i < 0:
+            i += self._n
+        self._poly_buf[i, 0] += offset.x()
+        self._poly_buf[i, 1] += offset.y()
+        self._invalidate_geometry()
 
     def highlightVertex(self, i, action):
         """Highlight a vertex appropriately based on the current action
@@ -336,25 +519,35 @@ class Shape(object):
             action (int): The action
             (see Shape.NEAR_VERTEX and Shape.MOVE_VERTEX)
         """
+        if (i, action) != (self._highlightIndex, self._highlightMode):
+            self._paths_dirty = True
         self._highlightIndex = i
         self._highlightMode = action
 
-    def init_poly_array(self):
-        self.poly_array = np.array([[p.x(), p.y()]
-                                            for p in self.points])
-
     def highlightClear(self):
         """Clear the highlighted point"""
+        if self._highlightIndex is not None:
+            self._paths_dirty = True
         self._highlightIndex = None
 
     def copy(self):
-        return copy.deepcopy(self)
+        # colors and settings are shared, only mutable state is duplicated
+        shape = type(self).__new__(type(self))
+        shape.__dict__.update(self.__dict__)
+        shape._poly_buf = self._poly_buf[:self._n].copy()
+        shape.flags = dict(self.flags)
+        # extra JSON keys may hold nested lists/dicts but no Qt objects
+        shape.other_data = copy.deepcopy(self.other_data)
+        shape._edge_cache = None
+        shape._paths_dirty = True
+        return shape
 
     def __len__(self):
-        return len(self.points)
+        return self._n
 
     def __getitem__(self, key):
         return self.points[key]
 
     def __setitem__(self, key, value):
-        self.points[key] = value
+        self.poly_array[key] = value.x(), value.y()
+        self._invalidate_geometry()
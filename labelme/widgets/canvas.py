@@ -108,10 +108,6 @@ class Canvas(QtWidgets.QWidget):
         self.distMap_crit = None
         self.keep_selected = False
 
-    def init_poly_array(self):
-        for s in self.shapes:
-            s.poly_array = np.array([[p.x(), p.y()] for p in s.points])
-
     def fillDrawing(self):
         return self._fill_drawing
 
@@ -444,9 +440,6 @@ class Canvas(QtWidgets.QWidget):
             for i, s in enumerate(self.shapes):
                 if not self.isVisible(s):
                     continue
-                if not hasattr(s, "poly_array"):
-                    s.poly_array = np.array([[p.x(), p.y()] for p in s.points])
-
                 self.apply_distTrans(s, i)
         else:
             assert isinstance(index, int),\
@@ -875,7 +868,9 @@ class Canvas(QtWidgets.QWidget):
         # m = (p1-p2).manhattanLength()
         # print "d %.2f, m %d, %.2f" % (d, m, d - m)
         # divide by scale to allow more precision when zoomed in
-        return labelme.utils.distance(p1 - p2) < (self.epsilon / self.scale)
+        epsilon = self.epsilon / self.scale
+        d = p1 - p2
+        return d.x() * d.x() + d.y() * d.y() < epsilon * epsilon
 
     def intersectionPoint(self, p1, p2):
         # Cycle through each image edge in clockwise fashion,
@@ -0,0 +1,217 @@
+import importlib
+
+import numpy as np
+import pytest
+from qtpy import QtCore
+from qtpy import QtGui
+
+from labelme import _shape_kernels
+from labelme import shape as shape_module
+from labelme.shape import Shape
+
+
+def _make_shape(coords):
+    shape = Shape()
+    for x, y in coords:
+        shape.addPoint(QtCore.QPointF(x, y))
+    return shape
+
+
+def test_add_insert_remove_point():
+    shape = _make_shape([(i, 2 * i) for i in range(20)])
+    assert shape.poly_array.shape == (20, 2)
+    np.testing.assert_array_equal(shape.poly_array[-1], [19, 38])
+
+    shape.insertPoint(3, QtCore.QPointF(-1, -2))
+    assert len(shape) == 21
+    np.testing.assert_array_equal(shape.poly_array[3], [-1, -2])
+    np.testing.assert_array_equal(shape.poly_array[4], [3, 6])
+
+    shape.moveBy(QtCore.QPointF(1, 1))
+    shape.moveBy(QtCore.QPointF(-1, -1))
+    assert shape[4] == QtCore.QPointF(3, 6)
+    np.testing.assert_array_equal(shape.poly_array[4], [3, 6])
+    shape.removePoint(3)
+    shape.popPoint()
+    assert len(shape) == 19
+    np.testing.assert_array_equal(
+        shape.poly_array, [[i, 2 * i] for i in range(19)]
+    )
+
+
+@pytest.mark.parametrize("use_kernel", [True, False])
+def test_nearest_edge(monkeypatch, use_kernel):
+    if not use_kernel:
+        monkeypatch.setattr(_shape_kernels, "scan", None)
+    shape = _make_shape([(0, 0), (10, 0), (10, 10), (0, 10)])
+    assert shape.nearestEdge(QtCore.QPointF(5, 1), 2) == 1
+    assert shape.nearestEdge(QtCore.QPointF(9, 5), 2) == 2
+    # closing edge between the last and the first vertex
+    assert shape.nearestEdge(QtCore.QPointF(1, 5), 2) == 4
+    assert shape.nearestEdge(QtCore.QPointF(5, 5), 2) is None
+    assert shape.nearestEdge(QtCore.QPointF(50, 5), 2) is None
+    assert shape.nearestVertex(QtCore.QPointF(50, 5), 2) == (None, None)
+    assert shape.nearestVertex(QtCore.QPointF(11, 11), 2) == (2, None)
+
+    assert shape.nearestEdge(QtCore.QPointF(1, 0.5), 2) == 1
+    shape.moveVertexBy(0, QtCore.QPointF(0, 6))
+    assert shape.nearestEdge(QtCore.QPointF(1, 0.5), 2) is None
+
+
+def test_scan_kernel_matches_numpy():
+    coords = np.random.RandomState(0).uniform(0, 100, (50, 2))
+    shape = _make_shape(coords)
+    for px, py in [(50, 50), (0, 0), coords[7] + 0.5]:
+        expected = shape._scan_numpy(px, py)
+        result = _shape_kernels._scan(px, py, shape.poly_array)
+        assert result[:2] == expected[:2]
+        np.testing.assert_allclose(result[2:], expected[2:])
+        if _shape_kernels.scan is not None:
+            jitted = _shape_kernels.scan(px, py, shape.poly_array)
+            assert jitted[:2] == expected[:2]
+            np.testing.assert_allclose(jitted[2:], expected[2:])
+
+
+def test_paint_reuses_cached_paths():
+    shape = _make_shape([(0, 0), (10, 0), (10, 10)])
+    shape.close()
+    image = QtGui.QImage(20, 20, QtGui.QImage.Format_ARGB32)
+    painter = QtGui.QPainter(image)
+    shape.paint(painter)
+    line_path = shape._line_path_cache
+    shape.paint(painter)
+    assert shape._line_path_cache is line_path
+
+    shape.moveVertexBy(2, QtCore.QPointF(-5, 0))
+    shape.paint(painter)
+    painter.end()
+    assert shape._line_path_cache is not line_path
+    assert (shape.x_span, shape.y_span) == (10, 10)
+
+    copied = shape.copy()
+    np.testing.assert_array_equal(copied.poly_array, shape.poly_array)
+
+
+def test_repeated_highlight_keeps_cached_paths():
+    shape = _make_shape([(0, 0), (10, 0), (10, 10)])
+    image = QtGui.QImage(20, 20, QtGui.QImage.Format_ARGB32)
+    painter = QtGui.QPainter(image)
+    shape.highlightVertex(1, Shape.MOVE_VERTEX)
+    shape.paint(painter)
+    vrtx_path = shape._vrtx_path_cache
+    shape.highlightVertex(1, Shape.MOVE_VERTEX)
+    shape.paint(painter)
+    assert shape._vrtx_path_cache is vrtx_path
+
+    shape.highlightClear()
+    shape.paint(painter)
+    vrtx_path = shape._vrtx_path_cache
+    shape.highlightClear()
+    shape.paint(painter)
+    painter.end()
+    assert shape._vrtx_path_cache is vrtx_path
+
+
+def test_paint_follows_point_size(monkeypatch):
+    shape = _make_shape([(0, 0), (10, 0), (10, 10)])
+    image = QtGui.QImage(20, 20, QtGui.QImage.Format_ARGB32)
+    painter = QtGui.QPainter(image)
+    shape.paint(painter)
+    rect = shape._vrtx_path_cache.boundingRect()
+    monkeypatch.setattr(Shape, "point_size", 2)
+    shape.paint(painter)
+    painter.end()
+    new_rect = shape._vrtx_path_cache.boundingRect()
+    assert new_rect != rect
+    assert new_rect == QtCore.QRectF(-1, -1, 12, 12)
+
+
+def test_points_view():
+    shape = _make_shape([(0, 0), (10, 0), (10, 10)])
+    assert list(shape.points) == [
+        QtCore.QPointF(0, 0),
+        QtCore.QPointF(10, 0),
+        QtCore.QPointF(10, 10),
+    ]
+    assert shape.points[1:] == [QtCore.QPointF(10, 0), QtCore.QPointF(10, 10)]
+
+    other = Shape()
+    other.points = shape.points
+    assert other.points == shape.points
+    other[0] = QtCore.QPointF(1, 1)
+    assert other.points != shape.points
+    assert shape[0] == QtCore.QPointF(0, 0)
+
+    other.points = other.points[0:1]
+    assert len(other) == 1
+    assert other.popPoint() == QtCore.QPointF(1, 1)
+    assert not other.points
+
+
+def test_copy_is_independent():
+    shape = _make_shape([(0, 0), (10, 0), (10, 10)])
+    shape.flags = {"occluded": False}
+    shape.other_data = {"tags": [1]}
+    copied = shape.copy()
+    copied.moveBy(QtCore.QPointF(1, 1))
+    copied.addPoint(QtCore.QPointF(0, 10))
+    copied.flags["occluded"] = True
+    copied.other_data["tags"].append(2)
+
+    assert len(shape) == 3 and len(copied) == 4
+    assert shape[0] == QtCore.QPointF(0, 0)
+    assert copied[0] == QtCore.QPointF(1, 1)
+    assert shape.flags == {"occluded": False}
+    assert shape.other_data == {"tags": [1]}
+
+    class SubShape(Shape):
+        pass
+
+    sub = SubShape()
+    assert type(sub.copy()) is SubShape
+
+
+def test_contains_point_follows_edits():
+    shape = _make_shape([(0, 0), (10, 0), (10, 10), (0, 10)])
+    assert shape.containsPoint(QtCore.QPointF(5, 5))
+    assert shape.boundingRect() == QtCore.QRectF(0, 0, 10, 10)
+
+    shape.moveBy(QtCore.QPointF(20, 0))
+    assert not shape.containsPoint(QtCore.QPointF(5, 5))
+    assert shape.boundingRect() == QtCore.QRectF(20, 0, 10, 10)
+
+
+def test_array_to_qpolygonf():
+    array = np.array([[0, 0], [10, 0.5], [10, 10]], dtype=np.float64)
+    polygon = shape_module._array_to_qpolygonf(array)
+    assert [(p.x(), p.y()) for p in polygon] == [(0, 0), (10, 0.5), (10, 10)]
+    assert shape_module._array_to_qpolygonf(array[:0]).isEmpty()
+
+
+def test_draw_vertices():
+    shape = _make_shape([(0, 0), (10, 0), (10, 10), (0, 10)])
+    path = QtGui.QPainterPath()
+    shape.drawVertices(path)
+    assert path.elementCount() == 4 * 13  # round handles
+
+    shape.highlightVertex(2, Shape.MOVE_VERTEX)
+    path = QtGui.QPainterPath()
+    shape.drawVertices(path)
+    assert path.elementCount() == 3 * 13 + 5  # one square handle
+
+
+def test_kernels_fall_back_when_numba_fails(monkeypatch):
+    numba = pytest.importorskip("numba")
+
+    def njit(*args, **kwargs):
+        raise RuntimeError("cannot cache function: no locator available")
+
+    monkeypatch.setattr(numba, "njit", njit)
+    try:
+        importlib.reload(_shape_kernels)
+        assert _shape_kernels.scan is None
+        shape = _make_shape([(0, 0), (10, 0), (10, 10), (0, 10)])
+        assert shape.nearestEdge(QtCore.QPointF(5, 1), 2) == 1
+    finally:
+        monkeypatch.undo()
+        importlib.reload(_shape_kernels)